@@ -1,8 +1,40 @@
+import functools
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import requests
 import plotly.express as px
+import pydeck as pdk
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import h3
+except ImportError:
+    h3 = None  # fall back to plain lat/lon grid binning
+
+# Above this many points we aggregate before rendering so the browser
+# receives a summary, not every raw occurrence.
+MAX_RAW_POINTS = 20_000
+
+# One pooled session for every OBIS/ERDDAP call: connections (and their
+# TLS handshakes) are reused across requests and tiles, transient server
+# errors are retried with backoff, and responses come back gzipped.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3),
+))
+SESSION.headers.update({"Accept-Encoding": "gzip"})
 
 # --------------------------------------------
 # Page Setup
@@ -25,13 +57,41 @@ lat_range = st.slider("Latitude Range", -90.0, 90.0, (10.0, 20.0))
 lon_range = st.slider("Longitude Range", -180.0, 180.0, (70.0, 80.0))
 
 # --------------------------------------------
-# 2️⃣ Helper: Fetch OBIS Data
+# 2️⃣ Helper: Persistent Disk Cache
+# --------------------------------------------
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
+
+def disk_cache(ttl=3600):
+    """File-backed DataFrame cache that survives restarts.
+
+    st.cache_data is per-process and lost whenever Streamlit restarts;
+    this keeps a parquet copy under cache/ keyed by the call arguments,
+    so repeated OBIS/ERDDAP pulls are served from disk within the TTL.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = hashlib.md5(repr((func.__name__, args, kwargs)).encode()).hexdigest()
+            path = os.path.join(CACHE_DIR, f"{key}.parquet")
+            if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+                return pd.read_parquet(path)
+            df = func(*args, **kwargs)
+            if isinstance(df, pd.DataFrame) and not df.empty:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                df.to_parquet(path)
+            return df
+        return wrapper
+    return decorator
+
+# --------------------------------------------
+# 3️⃣ Helper: Fetch OBIS Data
 # --------------------------------------------
 @st.cache_data(ttl=3600)
+@disk_cache(ttl=3600)
 def fetch_obis_data(species):
     try:
         url = f"https://api.obis.org/v3/occurrence?scientificName={species}&size=500"
-        data = requests.get(url).json()
+        data = SESSION.get(url, timeout=30).json()
         df = pd.json_normalize(data['results'])
         df = df[['scientificName', 'decimalLatitude', 'decimalLongitude', 'eventDate', 'depth']].dropna()
         df['eventDate'] = pd.to_datetime(df['eventDate'])
@@ -41,35 +101,115 @@ def fetch_obis_data(species):
         return pd.DataFrame()
 
 # --------------------------------------------
-# 3️⃣ Helper: Fetch NOAA Data (SST, SSS, Chl-a)
+# 4️⃣ Helper: Fetch NOAA Data (SST, SSS, Chl-a)
 # --------------------------------------------
+NOAA_DATASETS = {
+    "SST": "https://coastwatch.pfeg.noaa.gov/erddap/tabledap/erdAGsstamday.csv",
+    "Chl_a": "https://coastwatch.pfeg.noaa.gov/erddap/tabledap/erdMH1chlamday.csv",
+    "SSS": "https://coastwatch.pfeg.noaa.gov/erddap/tabledap/erdMWsstdmday.csv"
+}
+
+# Long time ranges are split into tiles of this many days so a large
+# query becomes several small concurrent pulls instead of one huge CSV.
+TILE_MAX_DAYS = 30
+TILE_MAX_WORKERS = 6
+
+# Quarter-degree spatial bins shared by the NOAA frames and the OBIS
+# occurrences, so merge_asof matches values from the same grid cell
+# instead of pairing points from opposite sides of the ocean.
+BINS_PER_DEGREE = 4
+
+def _bin_latlon(df, lat_col='latitude', lon_col='longitude'):
+    """Attach lat_bin/lon_bin keys used as merge_asof by-groups."""
+    df = df.copy()
+    df['lat_bin'] = (df[lat_col] * BINS_PER_DEGREE).round()
+    df['lon_bin'] = (df[lon_col] * BINS_PER_DEGREE).round()
+    return df
+
+def _time_tiles(start_date, end_date, max_days=TILE_MAX_DAYS):
+    """Split [start_date, end_date] into consecutive windows of <= max_days."""
+    tiles = []
+    tile_start = start_date
+    while tile_start <= end_date:
+        tile_end = min(tile_start + timedelta(days=max_days - 1), end_date)
+        tiles.append((tile_start, tile_end))
+        tile_start = tile_end + timedelta(days=1)
+    return tiles
+
+@disk_cache(ttl=3600)
+def _fetch_erddap_dataset(key, base_url, lat_range, lon_range, start_date, end_date):
+    """Fetch one ERDDAP dataset tile and normalize its value column name."""
+    url = (
+        f"{base_url}?time,latitude,longitude,{key.lower()}&"
+        f"latitude>={lat_range[0]}&latitude<={lat_range[1]}&"
+        f"longitude>={lon_range[0]}&longitude<={lon_range[1]}&"
+        f"time>={start_date}T00:00:00Z&time<={end_date}T00:00:00Z"
+    )
+    # Stream the response into pyarrow's CSV reader: parsing overlaps the
+    # download and produces typed Arrow columns directly, instead of
+    # buffering the whole body for pandas' slower parser.
+    try:
+        with SESSION.get(url, stream=True, timeout=60) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            table = pacsv.read_csv(resp.raw)
+    except requests.HTTPError:
+        # ERDDAP answers "no matching results" with an HTTP error status,
+        # and a short tile of a monthly product routinely matches nothing.
+        # An empty tile must not sink the tiles that did return data.
+        return pd.DataFrame()
+    df = table.to_pandas()
+    if not pd.api.types.is_datetime64_any_dtype(df['time']):
+        df['time'] = pd.to_datetime(df['time'])
+    return df.rename(columns={key.lower(): key})
+
 @st.cache_data(ttl=3600)
+@disk_cache(ttl=3600)
 def fetch_noaa_data(lat_range, lon_range, start_date, end_date):
     try:
-        datasets = {
-            "SST": "https://coastwatch.pfeg.noaa.gov/erddap/tabledap/erdAGsstamday.csv",
-            "Chl_a": "https://coastwatch.pfeg.noaa.gov/erddap/tabledap/erdMH1chlamday.csv",
-            "SSS": "https://coastwatch.pfeg.noaa.gov/erddap/tabledap/erdMWsstdmday.csv"
-        }
+        # Every (dataset, time-tile) pull is independent and network-bound,
+        # so fetch them all concurrently with a bounded pool. Each tile is
+        # disk-cached on its own, so growing a query only fetches the
+        # missing tiles.
+        tiles = _time_tiles(start_date, end_date)
+        jobs = [
+            (key, base_url, lat_range, lon_range, tile_start, tile_end)
+            for key, base_url in NOAA_DATASETS.items()
+            for tile_start, tile_end in tiles
+        ]
+        with ThreadPoolExecutor(max_workers=TILE_MAX_WORKERS) as pool:
+            results = list(pool.map(lambda job: _fetch_erddap_dataset(*job), jobs))
 
-        df_all = []
-        for key, base_url in datasets.items():
-            url = (
-                f"{base_url}?time,latitude,longitude,{key.lower()}&"
-                f"latitude>={lat_range[0]}&latitude<={lat_range[1]}&"
-                f"longitude>={lon_range[0]}&longitude<={lon_range[1]}&"
-                f"time>={start_date}T00:00:00Z&time<={end_date}T00:00:00Z"
-            )
-            df = pd.read_csv(url)
-            df['time'] = pd.to_datetime(df['time'])
-            df_all.append(df.rename(columns={key.lower(): key}))
+        frames_by_key = {key: [] for key in NOAA_DATASETS}
+        for job, df in zip(jobs, results):
+            if not df.empty:
+                frames_by_key[job[0]].append(df)
+        dfs = {
+            key: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            for key, frames in frames_by_key.items()
+        }
+        if dfs["SST"].empty:
+            return pd.DataFrame()
 
-        df_merged = df_all[0]
-        for df_next in df_all[1:]:
-            df_merged = pd.merge_asof(df_merged.sort_values('time'),
+        # Single-pass asof joins on time *within* each spatial bin — a SST
+        # reading only ever pairs with a Chl-a/SSS reading from the same
+        # grid cell, and the multi-by codepath is one hashed pass.
+        df_merged = _bin_latlon(dfs["SST"]).sort_values('time')
+        for key, df_next in dfs.items():
+            if key == "SST":
+                continue
+            if df_next.empty:
+                # No tile of this dataset matched; keep the column so
+                # downstream consumers still find it.
+                df_merged[key] = float('nan')
+                continue
+            df_next = _bin_latlon(df_next)[['time', 'lat_bin', 'lon_bin', key]]
+            df_merged = pd.merge_asof(df_merged,
                                       df_next.sort_values('time'),
                                       on='time',
-                                      direction='nearest')
+                                      by=['lat_bin', 'lon_bin'],
+                                      direction='nearest',
+                                      tolerance=pd.Timedelta('1D'))
         return df_merged
 
     except Exception as e:
@@ -77,7 +217,44 @@ def fetch_noaa_data(lat_range, lon_range, start_date, end_date):
         return pd.DataFrame()
 
 # --------------------------------------------
-# 4️⃣ Fetch & Merge Live Data
+# 5️⃣ Helper: Spatial Aggregation (hex-bin)
+# --------------------------------------------
+def aggregate_map_points(df, resolution=5):
+    """Hex-bin occurrence points so only a summary frame reaches Plotly.
+
+    Returns (df, aggregated) — if the frame is small enough it is passed
+    through untouched; otherwise points are binned (H3 cells when h3 is
+    installed, a 0.5° lat/lon grid otherwise) and SST/Chl-a/SSS are
+    averaged per cell with an occurrence count.
+    """
+    if len(df) <= MAX_RAW_POINTS:
+        return df, False
+
+    if h3 is not None:
+        to_cell = getattr(h3, "latlng_to_cell", None) or h3.geo_to_h3
+        df = df.assign(cell=[
+            to_cell(lat, lon, resolution)
+            for lat, lon in zip(df["decimalLatitude"], df["decimalLongitude"])
+        ])
+    else:
+        df = df.assign(cell=(
+            (df["decimalLatitude"] * 2).round().astype(str)
+            + "_"
+            + (df["decimalLongitude"] * 2).round().astype(str)
+        ))
+
+    df_agg = df.groupby("cell").agg(
+        decimalLatitude=("decimalLatitude", "mean"),
+        decimalLongitude=("decimalLongitude", "mean"),
+        SST=("SST", "mean"),
+        Chl_a=("Chl_a", "mean"),
+        SSS=("SSS", "mean"),
+        count=("decimalLatitude", "size"),
+    ).reset_index(drop=True)
+    return df_agg, True
+
+# --------------------------------------------
+# 6️⃣ Fetch & Merge Live Data
 # --------------------------------------------
 if st.button("🚀 Fetch Live Data"):
     with st.spinner("Fetching OBIS and NOAA data..."):
@@ -91,50 +268,103 @@ if st.button("🚀 Fetch Live Data"):
             st.warning("No NOAA data found for this region or period.")
             st.stop()
 
-        df_obis = df_obis.sort_values('eventDate')
+        df_obis = _bin_latlon(df_obis, lat_col='decimalLatitude',
+                              lon_col='decimalLongitude').sort_values('eventDate')
         df_noaa = df_noaa.sort_values('time')
 
         df_combined = pd.merge_asof(df_obis, df_noaa,
                                     left_on='eventDate',
                                     right_on='time',
+                                    by=['lat_bin', 'lon_bin'],
                                     direction='nearest',
                                     tolerance=pd.Timedelta('1D')).dropna(subset=['SST'])
-        
+
+        # Downcast before anything renders or exports the frame: float32
+        # halves per-column memory and the bytes serialized to the
+        # browser, and category columns dedupe the repeated species name.
+        for c in ['decimalLatitude', 'decimalLongitude', 'SST', 'Chl_a', 'SSS', 'depth']:
+            if c in df_combined.columns:
+                df_combined[c] = pd.to_numeric(df_combined[c], errors='coerce', downcast='float')
+        df_combined['scientificName'] = df_combined['scientificName'].astype('category')
+
         st.success(f"✅ Data merged successfully — {len(df_combined)} records ready!")
 
         # --------------------------------------------
-        # 5️⃣ Visualization: Map
+        # 7️⃣ Visualization: Map
         # --------------------------------------------
         st.subheader("📍 Fish Occurrences with Ocean Parameters")
-        fig = px.scatter_mapbox(
-            df_combined,
-            lat="decimalLatitude",
-            lon="decimalLongitude",
-            color="SST",
-            size="depth",
-            hover_data=["scientificName", "Chl_a", "SSS"],
-            color_continuous_scale="Viridis",
-            mapbox_style="carto-positron",
+        df_map, aggregated = aggregate_map_points(df_combined)
+        if aggregated:
+            st.caption(f"ℹ️ {len(df_combined)} points binned into {len(df_map)} cells for rendering.")
+            layer = pdk.Layer(
+                "ScatterplotLayer",
+                df_map,
+                get_position=["decimalLongitude", "decimalLatitude"],
+                get_fill_color="[SST * 4, 80, 200 - SST * 4]",
+                get_radius="count * 500",
+                radius_min_pixels=3,
+                pickable=True,
+            )
+            tooltip = {"text": "SST: {SST}\nChl-a: {Chl_a}\nSSS: {SSS}\nOccurrences: {count}"}
+        else:
+            layer = pdk.Layer(
+                "ScatterplotLayer",
+                df_map,
+                get_position=["decimalLongitude", "decimalLatitude"],
+                get_fill_color="[SST * 4, 80, 200 - SST * 4]",
+                get_radius="depth * 100",
+                radius_min_pixels=3,
+                pickable=True,
+            )
+            tooltip = {"text": "{scientificName}\nSST: {SST}\nChl-a: {Chl_a}\nSSS: {SSS}"}
+        view_state = pdk.ViewState(
+            latitude=float(df_map["decimalLatitude"].mean()),
+            longitude=float(df_map["decimalLongitude"].mean()),
             zoom=2,
-            title=f"{species} — SST, Chl-a, and SSS Overlay"
         )
-        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"{species} — SST, Chl-a, and SSS Overlay")
+        st.pydeck_chart(pdk.Deck(
+            layers=[layer],
+            initial_view_state=view_state,
+            map_style="light",
+            tooltip=tooltip,
+        ))
 
         # --------------------------------------------
-        # 6️⃣ Visualization: Time Series
+        # 8️⃣ Visualization: Time Series
         # --------------------------------------------
         st.subheader("📈 Environmental Trends (SST, Chl-a, SSS)")
-        trend_df = df_combined.groupby(df_combined['time'].dt.date)[['SST', 'Chl_a', 'SSS']].mean().reset_index()
+        # Group on a datetime64[D] key: int64-based hashing, instead of the
+        # per-row Python date objects .dt.date would allocate.
+        day_key = df_combined['time'].to_numpy().astype('datetime64[D]')
+        trend_df = (
+            df_combined[['SST', 'Chl_a', 'SSS']]
+            .groupby(day_key, sort=False)
+            .mean()
+            .sort_index()
+            .reset_index(names='time')
+        )
         fig2 = px.line(trend_df, x='time', y=['SST', 'Chl_a', 'SSS'],
                        labels={'value': 'Measurement', 'time': 'Date'},
                        title="Temporal Variation of Key Ocean Parameters")
         st.plotly_chart(fig2, use_container_width=True)
 
         # --------------------------------------------
-        # 7️⃣ Download & Model-Ready Export
+        # 9️⃣ Download & Model-Ready Export
         # --------------------------------------------
-        csv = df_combined.to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Download Processed Dataset", csv, "OceanSense_MergedData.csv", "text/csv")
+        # pyarrow writes the CSV column-by-column in C — no intermediate
+        # Python string of the whole dataset — and Parquet is offered as
+        # the compact, dtype-preserving alternative.
+        export_table = pa.Table.from_pandas(df_combined, preserve_index=False)
+        csv_buf = io.BytesIO()
+        pacsv.write_csv(export_table, csv_buf)
+        st.download_button("📥 Download Processed Dataset (CSV)", csv_buf.getvalue(),
+                           "OceanSense_MergedData.csv", "text/csv")
+
+        parquet_buf = io.BytesIO()
+        df_combined.to_parquet(parquet_buf, index=False)
+        st.download_button("📥 Download Processed Dataset (Parquet)", parquet_buf.getvalue(),
+                           "OceanSense_MergedData.parquet", "application/octet-stream")
 
         st.info("✅ Data ready for further analysis or model ingestion!")
 
@@ -2,10 +2,12 @@ import streamlit as st
 import pandas as pd
 import requests
 import plotly.express as px
+import pydeck as pdk
 import asyncio
+import collections
 import websockets
 import json
-import threading
+import msgpack
 from datetime import datetime, timedelta
 
 # ==========================================================
@@ -72,16 +74,21 @@ if tab_choice == "📊 Dataset View":
     if not fish_data.empty:
         st.subheader("📍 Fish Occurrence Map")
         if "decimalLatitude" in fish_data.columns and "decimalLongitude" in fish_data.columns:
-            fig = px.scatter_mapbox(
+            layer = pdk.Layer(
+                "ScatterplotLayer",
                 fish_data,
-                lat="decimalLatitude",
-                lon="decimalLongitude",
-                color="SST" if "SST" in fish_data.columns else None,
-                hover_data=fish_data.columns,
-                mapbox_style="carto-positron",
-                zoom=2
+                get_position=["decimalLongitude", "decimalLatitude"],
+                get_fill_color="[SST * 4, 80, 200 - SST * 4]" if "SST" in fish_data.columns else [0, 120, 200],
+                get_radius=5000,
+                radius_min_pixels=3,
+                pickable=True,
             )
-            st.plotly_chart(fig, use_container_width=True)
+            view_state = pdk.ViewState(
+                latitude=float(fish_data["decimalLatitude"].mean()),
+                longitude=float(fish_data["decimalLongitude"].mean()),
+                zoom=2,
+            )
+            st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view_state, map_style="light"))
 
         st.subheader("📈 Environmental Parameters")
         env_cols = [col for col in ["SST", "Chl_a", "SSS"] if col in fish_data.columns]
@@ -104,8 +111,35 @@ if tab_choice == "🛰️ Live Telemetry":
     st.markdown("This view updates automatically using **WebSocket** data from your backend simulation.")
 
     map_placeholder = st.empty()
+    chart_placeholder = st.empty()
     status_placeholder = st.empty()
+
+    # The speed chart is pixel-limited, so there is no point shipping more
+    # than ~1000 samples per fish to the browser.
+    MAX_CHART_POINTS = 1000
+
+    def downsample_series(group, n_out=MAX_CHART_POINTS):
+        """Uniformly decimate one fish's samples to at most n_out points."""
+        if len(group) <= n_out:
+            return group
+        step = len(group) // n_out + 1
+        return group.iloc[::step]
+    # Latest position per fish (dict-of-latest) plus a fixed-capacity ring
+    # buffer of raw telemetry. Appending to the deque is O(1); growing a
+    # DataFrame per message would copy the whole history every time.
     positions = {}
+    history = collections.deque(maxlen=10_000)
+
+    def apply_update(update):
+        """Apply one telemetry update to the latest-position and history buffers."""
+        positions[update["id"]] = {
+            "lat": update["lat"],
+            "lon": update["lon"],
+            "speed": update.get("speed"),
+            "heading": update.get("heading"),
+            "timestamp": update.get("timestamp")
+        }
+        history.append(update)
 
     async def run_websocket():
         """WebSocket client to receive live telemetry."""
@@ -114,40 +148,94 @@ if tab_choice == "🛰️ Live Telemetry":
                 status_placeholder.success("✅ Connected to telemetry server")
                 while True:
                     msg = await ws.recv()
-                    data = json.loads(msg)
+                    # Broadcasts and the connect snapshot arrive as
+                    # msgpack bytes; JSON text remains as a fallback.
+                    if isinstance(msg, (bytes, bytearray)):
+                        data = msgpack.unpackb(msg, raw=False)
+                    else:
+                        data = json.loads(msg)
                     if data.get("type") == "telemetry_update":
-                        positions[data["id"]] = {
-                            "lat": data["lat"],
-                            "lon": data["lon"],
-                            "speed": data.get("speed"),
-                            "heading": data.get("heading"),
-                            "timestamp": data.get("timestamp")
-                        }
+                        apply_update(data)
+                    elif data.get("type") == "telemetry_batch":
+                        for update in data["updates"]:
+                            apply_update(update)
                     elif data.get("type") == "snapshot":
                         positions.update(data["positions"])
 
+                    # Build DataFrames only at render time, never per append.
                     df = pd.DataFrame.from_dict(positions, orient="index").reset_index()
                     df.rename(columns={"index": "FishID"}, inplace=True)
+                    hist_df = pd.DataFrame(history) if history else pd.DataFrame()
 
                     if not df.empty:
-                        fig = px.scatter_mapbox(
+                        codes = df["FishID"].astype("category").cat.codes
+                        df["color"] = [[(37 * c) % 200 + 55, (91 * c) % 200 + 55, 200] for c in codes]
+                        # Build the hover text with column-level string ops —
+                        # a handful of C-level concatenations instead of a
+                        # Python f-string per row on every re-render.
+                        df["hover"] = (
+                            "ID: " + df["FishID"].astype(str)
+                            + "<br>Speed: " + df["speed"].astype(str)
+                            + "<br>Heading: " + df["heading"].astype(str)
+                            + "<br>Time: " + df["timestamp"].astype(str)
+                        )
+                        layer = pdk.Layer(
+                            "ScatterplotLayer",
                             df,
-                            lat="lat",
-                            lon="lon",
-                            color="FishID",
-                            hover_data=["speed", "heading", "timestamp"],
+                            get_position=["lon", "lat"],
+                            get_fill_color="color",
+                            get_radius=2000,
+                            radius_min_pixels=4,
+                            pickable=True,
+                        )
+                        layers = [layer]
+                        if not hist_df.empty:
+                            # One PathLayer holding every trail is a single
+                            # GPU draw call, not one polyline per fish.
+                            trails = [
+                                {"id": fish_id, "path": grp[["lon", "lat"]].to_numpy().tolist()}
+                                for fish_id, grp in hist_df.groupby("id")
+                            ]
+                            layers.insert(0, pdk.Layer(
+                                "PathLayer",
+                                trails,
+                                get_path="path",
+                                get_color=[120, 160, 210],
+                                get_width=20,
+                                width_min_pixels=2,
+                            ))
+                        view_state = pdk.ViewState(
+                            latitude=float(df["lat"].mean()),
+                            longitude=float(df["lon"].mean()),
                             zoom=3,
-                            mapbox_style="carto-positron"
                         )
-                        map_placeholder.plotly_chart(fig, use_container_width=True)
+                        map_placeholder.pydeck_chart(
+                            pdk.Deck(
+                                layers=layers,
+                                initial_view_state=view_state,
+                                map_style="light",
+                                tooltip={"html": "{hover}"},
+                            )
+                        )
+
+                    if not hist_df.empty and "speed" in hist_df.columns:
+                        speed_df = hist_df.groupby("id", group_keys=False).apply(downsample_series)
+                        fig_speed = px.line(
+                            speed_df,
+                            x="timestamp",
+                            y="speed",
+                            color="id",
+                            title="🏊 Speed over Time (downsampled)"
+                        )
+                        chart_placeholder.plotly_chart(fig_speed, use_container_width=True)
         except Exception as e:
             status_placeholder.error(f"⚠️ WebSocket connection failed: {e}")
 
-    # Run WebSocket in background thread
-    def start_ws_loop():
-        asyncio.new_event_loop().run_until_complete(run_websocket())
-
-    threading.Thread(target=start_ws_loop, daemon=True).start()
+    # Run the WebSocket listener on the script's own thread. Streamlit
+    # placeholders are bound to the ScriptRunContext, so updating them
+    # from a daemon thread silently drops renders and forces full-page
+    # reruns; blocking here keeps every update on the script thread.
+    asyncio.run(run_websocket())
 
 # ==========================================================
 # 🔹 Footer
@@ -0,0 +1,20 @@
+"""One-time conversion of rf_baseline_model.pkl to ONNX.
+
+Run this offline (requires skl2onnx); the prediction workers in main.py
+automatically prefer rf_baseline_model.onnx when it exists.
+"""
+import os
+
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+PKL_PATH = os.path.join(os.path.dirname(__file__), "rf_baseline_model.pkl")
+ONNX_PATH = os.path.join(os.path.dirname(__file__), "rf_baseline_model.onnx")
+
+if __name__ == "__main__":
+    rf = joblib.load(PKL_PATH)
+    model = convert_sklearn(rf, initial_types=[("X", FloatTensorType([None, 3]))])
+    with open(ONNX_PATH, "wb") as f:
+        f.write(model.SerializeToString())
+    print(f"✅ Wrote {ONNX_PATH}")
@@ -1,45 +1,179 @@
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks
+
+try:
+    # libuv-backed event loop: 2-4x asyncio network throughput for free.
+    # Must be installed before anything touches the loop.
+    import uvloop
+    uvloop.install()
+except ImportError:  # uvloop has no Windows wheels
+    pass
+
+import msgpack
+import orjson
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, Response
+from starlette.websockets import WebSocketState
 from pydantic import BaseModel
 import numpy as np
 import joblib
 import pandas as pd
-from typing import List
-import random
+from typing import Set
 import datetime
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 # ==========================================================
 # 🌊 OCEANSENSE-FISH BACKEND
 # ==========================================================
-app = FastAPI(title="OceanSense-Fish Backend")
+# orjson encodes every JSON response — stdlib json is pure Python and
+# dominates response time for large payloads like the productivity grid.
+app = FastAPI(title="OceanSense-Fish Backend", default_response_class=ORJSONResponse)
 
 # ==========================================================
 # 🔹 LOAD LOCAL CSV DATA
 # ==========================================================
 csv_path = os.path.join(os.path.dirname(__file__), "OBIS_Fisheries_Merged.csv")
+parquet_path = os.path.join(os.path.dirname(__file__), "OBIS_Fisheries_Merged.parquet")
 
-if os.path.exists(csv_path):
+if os.path.exists(parquet_path):
+    # Parquet decodes ~10-20x faster than CSV and preserves dtypes.
+    fish_data = pd.read_parquet(parquet_path, engine="pyarrow")
+    print(f"✅ Loaded Parquet: {fish_data.shape[0]} rows × {fish_data.shape[1]} cols")
+elif os.path.exists(csv_path):
     fish_data = pd.read_csv(csv_path)
-    print(f"✅ Loaded CSV: {fish_data.shape[0]} rows × {fish_data.shape[1]} cols")
+    # One-time conversion so every later startup takes the parquet path.
+    try:
+        fish_data.to_parquet(parquet_path)
+        print(f"✅ Loaded CSV and converted to {parquet_path}")
+    except Exception as e:
+        print(f"⚠️ Loaded CSV but parquet conversion failed: {e}")
 else:
     fish_data = pd.DataFrame()
-    print(f"⚠️ CSV not found at {csv_path}")
+    print(f"⚠️ No data file found at {parquet_path} or {csv_path}")
 
 # ==========================================================
 # 🔹 LOAD RANDOM FOREST MODEL (Safe Load)
 # ==========================================================
 model_path = os.path.join(os.path.dirname(__file__), "rf_baseline_model.pkl")
-rf = None
-if os.path.exists(model_path):
-    try:
-        rf = joblib.load(model_path)
-        print(f"✅ ML model loaded from {model_path}")
-    except Exception as e:
-        print(f"⚠️ Error loading model: {e}")
+# Produced offline by export_onnx.py; inference workers prefer it when
+# present — onnxruntime traverses the compiled forest several times
+# faster than sklearn's Python-wrapped trees.
+onnx_path = os.path.join(os.path.dirname(__file__), "rf_baseline_model.onnx")
+
+# The model is only ever loaded inside the prediction workers, never in
+# this process. onnxruntime mmaps the flat buffer read-only, so however
+# many workers (or uvicorn worker processes) open it, the OS page cache
+# holds one physical copy; the pickle fallback is unpickled only where
+# it is actually used. This process just checks what is available.
+model_available = os.path.exists(onnx_path) or os.path.exists(model_path)
+if os.path.exists(onnx_path):
+    print(f"✅ Compiled model found at {onnx_path}")
+elif model_available:
+    print(f"✅ Pickled model found at {model_path} — run export_onnx.py for faster startups")
 else:
     print(f"⚠️ No model found at {model_path}. ML predictions disabled.")
 
+# ==========================================================
+# 🔹 PREDICTION WORKER POOL
+# ==========================================================
+# Forest inference runs in separate processes so it never holds this
+# process's GIL while telemetry is being broadcast, and a slow predict
+# can't stall the event loop.
+_worker_rf = None
+_worker_sess = None
+
+def _init_predict_worker(pkl_path, compiled_path):
+    """Load the compiled model if present, else the pickled forest."""
+    global _worker_rf, _worker_sess
+    if os.path.exists(compiled_path):
+        try:
+            import onnxruntime
+            _worker_sess = onnxruntime.InferenceSession(
+                compiled_path, providers=["CPUExecutionProvider"])
+            return
+        except Exception as e:
+            print(f"⚠️ ONNX model load failed ({e}); falling back to pickle.")
+    _worker_rf = joblib.load(pkl_path)
+    # Tree voting is embarrassingly parallel — use every core.
+    if hasattr(_worker_rf, "set_params"):
+        _worker_rf.set_params(n_jobs=-1)
+
+def _run_predict(X):
+    # No-op view for the float32 arrays the endpoint builds; only copies
+    # if a caller ever hands over float64.
+    X = np.asarray(X, dtype=np.float32)
+    if _worker_sess is not None:
+        input_name = _worker_sess.get_inputs()[0].name
+        return _worker_sess.run(None, {input_name: X})[0].ravel()
+    return _worker_rf.predict(X)
+
+predict_pool = None
+if model_available:
+    predict_pool = ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        initializer=_init_predict_worker,
+        initargs=(model_path, onnx_path),
+    )
+
+# Concurrent small /predict calls pay the per-call dispatch overhead N
+# times; the batcher coalesces requests arriving within a few ms into
+# one forest call and scatters the slices back to each waiter.
+PREDICT_BATCH_SIZE = 32
+PREDICT_BATCH_WAIT = 0.005
+
+predict_queue: asyncio.Queue = asyncio.Queue()
+
+async def predict_batcher():
+    """Coalesce queued predict inputs into single batched forest calls."""
+    loop = asyncio.get_running_loop()
+    while True:
+        entry = await predict_queue.get()
+        batch = [entry]
+        deadline = loop.time() + PREDICT_BATCH_WAIT
+        while len(batch) < PREDICT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(predict_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        X_all = np.vstack([X for X, _ in batch])
+        try:
+            y_all = await loop.run_in_executor(predict_pool, _run_predict, X_all)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        offset = 0
+        for X, future in batch:
+            if not future.done():
+                future.set_result(y_all[offset:offset + X.shape[0]])
+            offset += X.shape[0]
+
+@app.on_event("startup")
+async def warm_up_model():
+    """Prime the pool's workers and start the micro-batcher."""
+    global predict_pool
+    if predict_pool is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            predict_pool, _run_predict, np.zeros((16, 3), dtype=np.float32))
+    except Exception as e:
+        # Safe load: an unloadable model (missing scikit-learn, corrupt
+        # or version-mismatched pickle) breaks the pool initializer and
+        # would otherwise abort startup. Degrade to a disabled /predict,
+        # like the original safe-load block did.
+        print(f"⚠️ Model warm-up failed: {e}. ML predictions disabled.")
+        predict_pool.shutdown(wait=False, cancel_futures=True)
+        predict_pool = None
+        return
+    asyncio.create_task(predict_batcher())
+
 # ==========================================================
 # 🔹 MACHINE LEARNING PREDICTION ENDPOINT
 # ==========================================================
@@ -49,17 +183,36 @@ class PredictionInput(BaseModel):
     sss: list
 
 @app.post("/predict")
-def predict(input_data: PredictionInput):
-    if rf is None:
+async def predict(input_data: PredictionInput):
+    """Predict the productivity map for a grid of SST/Chl-a/SSS values.
+
+    Features are float32 end-to-end — half the memory traffic of
+    float64 through the trees; predictions are reproducible within
+    float32 precision.
+    """
+    if predict_pool is None:
         return {"error": "Model not loaded. Please ensure rf_baseline_model.pkl is available."}
 
-    sst = np.array(input_data.sst)
-    chl = np.array(input_data.chl_anomaly)
-    sss = np.array(input_data.sss)
-    X_input = np.stack([sst.flatten(), chl.flatten(), sss.flatten()], axis=1)
-    y_pred = rf.predict(X_input)
-    grid_pred = y_pred.reshape(sst.shape)
-    return {"productivity_map": grid_pred.tolist()}
+    sst = np.asarray(input_data.sst, dtype=np.float32)
+    chl = np.asarray(input_data.chl_anomaly, dtype=np.float32)
+    sss = np.asarray(input_data.sss, dtype=np.float32)
+    # Preallocate the (n, 3) feature matrix once and fill it column-wise
+    # from ravel() views — no intermediate stack allocation, and float32
+    # halves the bytes read during tree traversal.
+    X_input = np.empty((sst.size, 3), dtype=np.float32)
+    X_input[:, 0] = sst.ravel()
+    X_input[:, 1] = chl.ravel()
+    X_input[:, 2] = sss.ravel()
+    future = asyncio.get_running_loop().create_future()
+    await predict_queue.put((X_input, future))
+    y_pred = await future
+    # Keep the result as a contiguous float32 ndarray: orjson writes the
+    # buffer straight to JSON, with no .tolist() materializing a Python
+    # float object per grid cell.
+    grid_pred = np.ascontiguousarray(y_pred.reshape(sst.shape), dtype=np.float32)
+    payload = orjson.dumps({"productivity_map": grid_pred},
+                           option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(payload, media_type="application/json")
 
 # ==========================================================
 # 🔹 CSV DATA ENDPOINT (JSON-SAFE)
@@ -70,38 +223,136 @@ def get_fish_data():
     if fish_data.empty:
         return {"message": "No CSV data available."}
 
-    # Replace NaN and inf values with None for JSON
-    safe_df = fish_data.replace({np.nan: None, np.inf: None, -np.inf: None})
-    return safe_df.to_dict(orient="records")
+    # orjson writes numeric columns straight from their numpy buffers and
+    # emits null for NaN/inf on its own, so the old full-frame .replace
+    # (which copied everything to object dtype) is unnecessary.
+    columns = {
+        col: fish_data[col].to_numpy()
+        if fish_data[col].dtype.kind in "ifuM"
+        else fish_data[col].tolist()
+        for col in fish_data.columns
+    }
+    payload = orjson.dumps(columns, option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(payload, media_type="application/json")
 
 # ==========================================================
 # 🔹 REAL-TIME TELEMETRY (WebSocket)
 # ==========================================================
 class ConnectionManager:
+    # Frames buffered per connection before the oldest gets dropped.
+    OUT_QUEUE_SIZE = 256
+    # A peer with a full kernel send buffer keeps send_bytes pending
+    # forever; time out and evict instead of accumulating stuck sends.
+    SEND_TIMEOUT = 2.0
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # A set gives O(1) membership and removal under connect/disconnect
+        # churn; broadcast still iterates a snapshot copy.
+        self.active_connections: Set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        # Each connection gets its own bounded outbound queue drained by
+        # a long-lived relay task, so a slow consumer only ever backs up
+        # its own queue instead of the whole broadcast path.
+        websocket._out_q = asyncio.Queue(maxsize=self.OUT_QUEUE_SIZE)
+        websocket._relay_task = asyncio.create_task(self._relay(websocket))
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
+        relay_task = getattr(websocket, "_relay_task", None)
+        if relay_task is not None:
+            relay_task.cancel()
 
-    async def broadcast(self, message: dict):
-        living_connections = []
-        for connection in list(self.active_connections):
+    async def _relay(self, websocket: WebSocket):
+        """Drain one connection's outbound queue into its socket."""
+        try:
+            while True:
+                payload = await websocket._out_q.get()
+                await asyncio.wait_for(
+                    websocket.send_bytes(payload), timeout=self.SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Timed out or failed: evict the client and close its socket.
+            # Not via disconnect() — that cancels this very task, and the
+            # pending CancelledError would land on the close() await and
+            # skip the handshake.
+            self.active_connections.discard(websocket)
             try:
-                await connection.send_json(message)
-                living_connections.append(connection)
+                await websocket.close()
             except Exception:
                 pass
-        self.active_connections = living_connections
+
+    @staticmethod
+    def pack(message: dict) -> bytes:
+        """Serialize a message once; every client shares the same bytes."""
+        return msgpack.packb(message, use_bin_type=True)
+
+    async def broadcast(self, message: dict):
+        # Pack once per message — every client gets the same bytes, and
+        # msgpack frames are a fraction of the equivalent JSON text.
+        payload = self.pack(message)
+        for connection in list(self.active_connections):
+            # Don't queue onto sockets that are already closing.
+            if connection.client_state != WebSocketState.CONNECTED:
+                self.disconnect(connection)
+                continue
+            queue = connection._out_q
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # The client is falling behind: drop its oldest frame to
+                # make room rather than blocking everyone else.
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+                try:
+                    queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    pass
 
 manager = ConnectionManager()
 latest_positions = {}
 
+# The packed /ws connect snapshot, rebuilt lazily after a position write
+# instead of re-serializing the whole dict on every connect.
+_snapshot_cache = None
+
+def invalidate_snapshot():
+    global _snapshot_cache
+    _snapshot_cache = None
+
+def snapshot_bytes():
+    """Return the packed snapshot, re-serializing only after writes."""
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        _snapshot_cache = ConnectionManager.pack(
+            {"type": "snapshot", "positions": latest_positions})
+    return _snapshot_cache
+
+# Ingested updates flow through one queue drained by a single broadcaster
+# coroutine that coalesces bursts into telemetry_batch messages. /ingest
+# returns as soon as its message is queued, and unlike a latest-per-fish
+# dict, the queue preserves every intermediate fix in order.
+broadcast_q: asyncio.Queue = asyncio.Queue()
+BATCH_MAX = 256
+FLUSH_INTERVAL = 0.02
+
+async def broadcaster():
+    """Drain queued ingest updates into batched broadcasts."""
+    while True:
+        batch = [await broadcast_q.get()]
+        while len(batch) < BATCH_MAX:
+            try:
+                batch.append(broadcast_q.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        await manager.broadcast({"type": "telemetry_batch", "updates": batch})
+        await asyncio.sleep(FLUSH_INTERVAL)
+
 class Telemetry(BaseModel):
     id: str
     timestamp: str
@@ -112,8 +363,8 @@ class Telemetry(BaseModel):
     extra: dict = None
 
 @app.post("/ingest")
-async def ingest_telemetry(payload: Telemetry, background_tasks: BackgroundTasks):
-    """Receive telemetry data and broadcast to clients."""
+async def ingest_telemetry(payload: Telemetry):
+    """Receive telemetry data and queue it for the batched broadcast."""
     latest_positions[payload.id] = {
         "timestamp": payload.timestamp,
         "lat": payload.lat,
@@ -122,6 +373,7 @@ async def ingest_telemetry(payload: Telemetry, background_tasks: BackgroundTasks
         "heading": payload.heading,
         "extra": payload.extra,
     }
+    invalidate_snapshot()
     message = {
         "type": "telemetry_update",
         "id": payload.id,
@@ -131,7 +383,7 @@ async def ingest_telemetry(payload: Telemetry, background_tasks: BackgroundTasks
         "speed": payload.speed,
         "heading": payload.heading,
     }
-    background_tasks.add_task(manager.broadcast, message)
+    broadcast_q.put_nowait(message)
     return {"status": "ok"}
 
 @app.websocket("/ws")
@@ -139,37 +391,49 @@ async def websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections."""
     await manager.connect(websocket)
     try:
-        # Send snapshot of current positions
-        snapshot = {"type": "snapshot", "positions": latest_positions}
-        await websocket.send_json(snapshot)
+        # Send snapshot of current positions (cached bytes, O(1) amortized)
+        await websocket.send_bytes(snapshot_bytes())
         while True:
             data = await websocket.receive_text()
-            await websocket.send_text(f"Server received: {data}")
+            # Same binary framing as every other server message.
+            await websocket.send_bytes(
+                manager.pack({"type": "echo", "message": f"Server received: {data}"}))
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
 # ==========================================================
 # 🔹 SIMULATED TELEMETRY
 # ==========================================================
+rng = np.random.default_rng()
+
 async def simulate_telemetry():
     """Generate simulated fish movement data."""
     fish_ids = ["fish1", "fish2", "fish3"]
     while True:
-        for fish_id in fish_ids:
+        # One batched broadcast per tick instead of one fan-out per fish.
+        # All randomness for the tick is one vectorized draw, and every
+        # fish shares the tick's timestamp — no per-fish random/now calls.
+        r = rng.random((len(fish_ids), 4))
+        timestamp = datetime.datetime.utcnow().isoformat()
+        updates = []
+        for i, fish_id in enumerate(fish_ids):
             payload = {
                 "type": "telemetry_update",
                 "id": fish_id,
-                "timestamp": datetime.datetime.utcnow().isoformat(),
-                "lat": 18.5 + random.random(),
-                "lon": 73.8 + random.random(),
-                "speed": round(random.uniform(1, 5), 2),
-                "heading": random.randint(0, 360)
+                "timestamp": timestamp,
+                "lat": 18.5 + float(r[i, 0]),
+                "lon": 73.8 + float(r[i, 1]),
+                "speed": round(1 + float(r[i, 2]) * 4, 2),
+                "heading": int(r[i, 3] * 360)
             }
             latest_positions[payload["id"]] = payload
-            await manager.broadcast(payload)
+            updates.append(payload)
+        invalidate_snapshot()
+        await manager.broadcast({"type": "telemetry_batch", "updates": updates})
         await asyncio.sleep(2)
 
 @app.on_event("startup")
 async def start_simulation():
-    """Run telemetry simulation at startup."""
+    """Run telemetry simulation and the batched broadcaster."""
+    asyncio.create_task(broadcaster())
     asyncio.create_task(simulate_telemetry())
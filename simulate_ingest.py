@@ -1,10 +1,11 @@
-import requests
-import time
+import asyncio
 import random
 from datetime import datetime
 
+import httpx
+
 # URL of your running FastAPI backend
-URL = "http://127.0.0.1:8000/ingest"
+BASE_URL = "http://127.0.0.1:8000"
 
 def fake_point(id_):
     lat = 12 + random.random() * 2   # example latitude range
@@ -20,10 +21,19 @@ def fake_point(id_):
     }
     return payload
 
-if __name__ == "__main__":
+async def main():
     ids = ["tag-A", "tag-B", "tag-C"]
-    while True:
-        for id_ in ids:
-            r = requests.post(URL, json=fake_point(id_))
-            print(r.status_code, r.text)
-        time.sleep(2)  # send updates every 2 seconds
+    # One pooled client for the whole run, and each tick's posts go out
+    # concurrently — throughput is limited by the server, not by the
+    # client waiting out one round trip per fish.
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        while True:
+            responses = await asyncio.gather(
+                *(client.post("/ingest", json=fake_point(id_)) for id_ in ids)
+            )
+            for r in responses:
+                print(r.status_code, r.text)
+            await asyncio.sleep(2)  # send updates every 2 seconds
+
+if __name__ == "__main__":
+    asyncio.run(main())